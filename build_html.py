@@ -1,626 +1,249 @@
 import csv
+import gzip
 import json
+import operator
 import os
+import re
+import shutil
 from datetime import datetime, timezone
 
-HISTORY_CSV = "history.csv"
-OUT_HTML = os.path.join("docs", "index.html")
-
+from jinja2 import Environment, FileSystemLoader
 
-def read_rows():
-    if not os.path.exists(HISTORY_CSV):
-        return []
-    with open(HISTORY_CSV, "r", encoding="utf-8", newline="") as f:
-        rows = list(csv.DictReader(f))
-    return rows
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-def is_real_row(r: dict) -> bool:
+HISTORY_CSV = "history.csv"
+OUT_HTML = os.path.join("docs", "index.html")
+OUT_DATA = os.path.join("docs", "data.json")
+SRC_CSS = os.path.join("assets", "style.css")
+OUT_CSS = os.path.join("docs", "style.css")
+
+TEMPLATE = os.path.join("templates", "index.html.j2")
+
+env = Environment(loader=FileSystemLoader("templates"), autoescape=False, auto_reload=False)
+tmpl = env.get_template("index.html.j2")
+
+
+def dump_json(obj):
+    # Bytes straight through: orjson already emits UTF-8, so there is no
+    # decode/re-encode round trip before the binary write.
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), check_circular=False).encode("utf-8")
+
+
+def write_compressed(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    # mtime=0 keeps the .gz byte-stable when the content doesn't change
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+TZ_SUFFIX = re.compile(r"([+-]\d\d:\d\d)$")
+
+
+def fmt_time(s):
+    # Python port of the old client-side fmtTime: "YYYY-MM-DD HH:MM" + zone.
+    if not s:
+        return ""
+    base = s.replace("T", " ")[:16]
+    if s.endswith("Z"):
+        return base + " UTC"
+    m = TZ_SUFFIX.search(s)
+    if m:
+        return base + " (UTC" + m.group(1) + ")"
+    return base
+
+
+def fmt_period(onset, expires):
+    a = fmt_time(onset)
+    b = fmt_time(expires)
+    if a and b:
+        return a + " → " + b
+    return a or b
+
+
+def epoch_utc(ts):
+    try:
+        return int(datetime.fromisoformat(ts).timestamp())
+    except ValueError:
+        return 0
+
+
+def tail_lines(path, n):
+    """Last n text lines of path via reverse 64 KiB reads — O(n) regardless
+    of how large the append-only CSV has grown. Terminators are kept so
+    csv.reader can reassemble quoted fields that span lines verbatim."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        chunks = []
+        newlines = 0
+        while pos > 0 and newlines <= n:
+            step = min(1 << 16, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    data = b"".join(reversed(chunks))
+    lines = data.decode("utf-8", "replace").splitlines(keepends=True)
+    if pos > 0 and lines:
+        lines = lines[1:]  # first line may be a partial record
+    return lines[-n:]
+
+
+def read_table():
+    """Read history.csv in one streaming pass, returning (cols, ci, rows) with
+    positional access — no per-row dict allocation or column-name hashing like
+    csv.DictReader, and no intermediate raw-row list before validity filtering.
+
+    With HISTORY_LIMIT set (>0) and a file over 1 MiB, only the tail of the
+    CSV is read and parsed, bounding build I/O as the archive grows."""
+    if not os.path.exists(HISTORY_CSV):
+        return [], {}, []
+
+    limit = int(os.getenv("HISTORY_LIMIT", "0") or 0)
+    if limit > 0 and os.path.getsize(HISTORY_CSV) > (1 << 20):
+        with open(HISTORY_CSV, "r", encoding="utf-8", newline="") as f:
+            cols = next(csv.reader([f.readline()]), [])
+        ci = {c: i for i, c in enumerate(cols)}
+        ncols = len(cols)
+        rows = []
+        append = rows.append
+        for r in csv.reader(tail_lines(HISTORY_CSV, limit + 1)):
+            if len(r) != ncols:  # partial record cut at the window boundary
+                continue
+            if r == cols:  # tail reached the top of the file: the header row
+                continue
+            if is_real_row(r, ci):
+                append(r)
+        # limit + 1 lines are read so the header is covered when the tail
+        # reaches the top of the file; deep in a file that slack becomes an
+        # extra record, so trim to the limit here.
+        return cols, ci, rows[-limit:]
+
+    # 64 KiB read buffer: the full pass over a multi-MB archive does a
+    # handful of read() syscalls instead of one per default 8 KiB block.
+    with open(HISTORY_CSV, "r", encoding="utf-8", newline="", buffering=1 << 16) as f:
+        it = csv.reader(f)
+        cols = next(it, [])
+        ci = {c: i for i, c in enumerate(cols)}
+        ncols = len(cols)
+        rows = []
+        append = rows.append
+        for r in it:
+            if len(r) != ncols:  # ragged line — pad/trim to the header width
+                r = (r + [""] * ncols)[:ncols]
+            if is_real_row(r, ci):
+                append(r)
+    return cols, ci, rows
+
+
+def is_real_row(r, ci) -> bool:
     """
     Drop garbage/partial rows (the ones you see as timestamp-only empty rows).
     We consider a row 'real' if it has at least level+event/hazard/areas or a description.
     """
-    ts = (r.get("timestamp_utc") or "").strip()
-    level = (r.get("level") or "").strip()
-    event = (r.get("event") or "").strip()
-    hazard = (r.get("hazard") or "").strip()
-    areas = (r.get("areas") or "").strip()
-    desc = (r.get("description") or "").strip()
-    onset = (r.get("onset") or "").strip()
-    expires = (r.get("expires") or "").strip()
-
     # If it has no timestamp, it’s not useful.
-    if not ts:
+    if not r[ci["timestamp_utc"]].strip():
         return False
 
     # If timestamp exists but everything else is empty → drop it.
-    if not (level or event or hazard or areas or desc or onset or expires):
+    return any(
+        r[ci[k]].strip()
+        for k in ("level", "event", "hazard", "areas", "description", "onset", "expires")
+    )
+
+
+def sync_css():
+    # Static stylesheet: only copy when the source is newer, so unchanged
+    # builds leave docs/style.css (and its caching headers) alone.
+    if not os.path.exists(OUT_CSS) or os.path.getmtime(SRC_CSS) > os.path.getmtime(OUT_CSS):
+        shutil.copyfile(SRC_CSS, OUT_CSS)
+        write_compressed(OUT_CSS)
+
+
+def up_to_date():
+    """True when docs/ already reflects the current CSV and template, letting
+    main() return without even opening the CSV on no-change runs."""
+    try:
+        return (os.path.getmtime(OUT_DATA) >= os.path.getmtime(HISTORY_CSV)
+                and os.path.getmtime(OUT_HTML) >= os.path.getmtime(TEMPLATE))
+    except OSError:
         return False
 
-    # Also drop any row that somehow has only timestamp + spaces.
-    if (level or event or hazard or areas or desc or onset or expires) is False:
-        return False
-
-    return True
-
 
 def main():
-    rows = [r for r in read_rows() if is_real_row(r)]
     gen = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    data_json = json.dumps(rows, ensure_ascii=False)
 
     os.makedirs("docs", exist_ok=True)
 
-    html = f"""<!doctype html>
-<html lang="lv">
-<head>
-  <meta charset="utf-8" />
-  <meta name="viewport" content="width=device-width, initial-scale=1" />
-  <title>LVGMC brīdinājumu arhīvs</title>
-  <style>
-    :root {{
-      --bg: #f6f7fb;
-      --card: #ffffff;
-      --text: #0f172a;
-      --muted: #475569;
-      --border: #e2e8f0;
-      --border2: #edf2f7;
-      --shadow: 0 12px 35px rgba(2, 6, 23, 0.10);
-      --blue: #2563eb;
-      --chip: #f1f5f9;
-    }}
-
-    * {{ box-sizing: border-box; }}
-    body {{
-      margin: 0;
-      font-family: system-ui, -apple-system, Segoe UI, Roboto, Arial, sans-serif;
-      background: var(--bg);
-      color: var(--text);
-      line-height: 1.35;
-    }}
-
-    .wrap {{
-      max-width: 1320px;
-      margin: 24px auto 70px;
-      padding: 0 16px;
-    }}
-
-    header {{
-      display: flex;
-      flex-direction: column;
-      gap: 6px;
-      margin-bottom: 14px;
-    }}
-
-    h1 {{
-      margin: 0;
-      font-size: 26px;
-      letter-spacing: .2px;
-    }}
-
-    .sub {{
-      color: var(--muted);
-      font-size: 13px;
-      display: flex;
-      flex-wrap: wrap;
-      gap: 8px;
-      align-items: center;
-    }}
-
-    .sub a {{
-      color: var(--blue);
-      text-decoration: none;
-      font-weight: 600;
-    }}
-    .sub a:hover {{ text-decoration: underline; }}
-
-    .card {{
-      margin-top: 14px;
-      border: 1px solid var(--border);
-      border-radius: 16px;
-      overflow: hidden;
-      background: var(--card);
-      box-shadow: var(--shadow);
-    }}
-
-    /* Sticky area (legend + filters) */
-    .sticky {{
-      position: sticky;
-      top: 0;
-      z-index: 50;
-      background: #ffffffcc;
-      backdrop-filter: blur(8px);
-      border-bottom: 1px solid var(--border);
-    }}
-
-    .legend {{
-      display: flex;
-      gap: 12px;
-      flex-wrap: wrap;
-      padding: 12px 14px;
-    }}
-    .lg-item {{
-      display: inline-flex;
-      align-items: center;
-      gap: 8px;
-      font-size: 12px;
-      color: var(--muted);
-    }}
-    .lg-dot {{
-      width: 12px;
-      height: 12px;
-      border-radius: 999px;
-      border: 1px solid rgba(0,0,0,.15);
-    }}
-    .dot-yellow {{ background: #f5d90a; }}
-    .dot-orange {{ background: #ff8a00; }}
-    .dot-red {{ background: #ff3b30; }}
-
-    .toolbar {{
-      padding: 12px 14px 14px;
-      display: grid;
-      gap: 10px;
-      grid-template-columns: 1fr;
-    }}
-
-    @media (min-width: 980px) {{
-      .toolbar {{
-        grid-template-columns: 1.6fr .8fr .9fr .9fr .8fr;
-        align-items: center;
-      }}
-    }}
-
-    input, select {{
-      width: 100%;
-      padding: 10px 12px;
-      border-radius: 12px;
-      border: 1px solid var(--border);
-      background: #fff;
-      color: var(--text);
-      outline: none;
-    }}
-
-    input::placeholder {{ color: #94a3b8; }}
-
-    .btn {{
-      padding: 10px 12px;
-      border-radius: 12px;
-      border: 1px solid var(--border);
-      background: #fff;
-      color: var(--text);
-      cursor: pointer;
-      font-weight: 600;
-    }}
-    .btn:hover {{ background: #f8fafc; }}
-
-    .btn-primary {{
-      border-color: rgba(37, 99, 235, .35);
-      color: #1d4ed8;
-      background: #eff6ff;
-    }}
-    .btn-primary:hover {{ background: #dbeafe; }}
-
-    .table-wrap {{
-      overflow: auto;
-      max-height: 76vh;
-      background: #fff;
-    }}
-
-    table {{
-      width: 100%;
-      border-collapse: collapse;
-      min-width: 1180px;
-    }}
-
-    th, td {{
-      padding: 12px 12px;
-      border-bottom: 1px solid var(--border2);
-      vertical-align: top;
-      font-size: 13px;
-    }}
-
-    /* Sticky header INSIDE the scroll container */
-    thead th {{
-      position: sticky;
-      top: 0;
-      z-index: 10;
-      background: #fff;
-      color: var(--muted);
-      font-size: 12px;
-      text-align: left;
-      letter-spacing: .2px;
-      border-bottom: 1px solid var(--border);
-    }}
-
-    tbody tr:hover {{ background: #f8fafc; }}
-
-    td.col-time {{ white-space: nowrap; color: #0f172a; }}
-
-    .badge {{
-      display: inline-block;
-      padding: 6px 10px;
-      border-radius: 999px;
-      font-weight: 800;
-      font-size: 12px;
-      border: 1px solid rgba(0,0,0,.12);
-      color: #111;
-      background: var(--chip);
-    }}
-    .YELLOW {{ background: #f5d90a; }}
-    .ORANGE {{ background: #ff8a00; }}
-    .RED {{ background: #ff3b30; color: #fff; }}
-
-    a {{
-      color: var(--blue);
-      text-decoration: none;
-      font-weight: 600;
-    }}
-    a:hover {{ text-decoration: underline; }}
-
-    .footer {{
-      display: flex;
-      justify-content: space-between;
-      gap: 10px;
-      padding: 12px 14px;
-      color: var(--muted);
-      font-size: 12px;
-      border-top: 1px solid var(--border);
-      flex-wrap: wrap;
-      background: #fff;
-    }}
-
-    .pager {{
-      display: flex;
-      gap: 8px;
-      align-items: center;
-      flex-wrap: wrap;
-    }}
-
-    /* Modal */
-    .modal-backdrop {{
-      position: fixed;
-      inset: 0;
-      background: rgba(2, 6, 23, .55);
-      display: none;
-      align-items: center;
-      justify-content: center;
-      padding: 18px;
-      z-index: 9999;
-    }}
-
-    .modal {{
-      width: min(900px, 96vw);
-      max-height: 85vh;
-      overflow: auto;
-      background: #ffffff;
-      border: 1px solid var(--border);
-      border-radius: 16px;
-      padding: 16px;
-      box-shadow: var(--shadow);
-    }}
-
-    .modal .topbar {{
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      gap: 10px;
-      margin-bottom: 10px;
-    }}
-
-    .modal h3 {{
-      margin: 0;
-      font-size: 16px;
-      color: #0f172a;
-    }}
-
-    .modal pre {{
-      white-space: pre-wrap;
-      word-break: break-word;
-      margin: 0;
-      font-family: inherit;
-      font-size: 13px;
-      color: #0f172a;
-      line-height: 1.45;
-    }}
-  </style>
-</head>
-<body>
-  <div class="wrap">
-    <header>
-      <h1>LVGMC brīdinājumu arhīvs (bot)</h1>
-      <div class="sub">
-        Ģenerēts: <b>{gen}</b>
-        <span>•</span>
-        <span>Avots: <a href="./history.csv" target="_blank" rel="noreferrer">history.csv</a></span>
-        <span>•</span>
-        <span id="summary"></span>
-      </div>
-    </header>
-
-    <div class="card">
-      <div class="sticky">
-        <div class="legend">
-          <div class="lg-item"><span class="lg-dot dot-yellow"></span> Dzeltenais — potenciāli bīstams</div>
-          <div class="lg-item"><span class="lg-dot dot-orange"></span> Oranžais — bīstams</div>
-          <div class="lg-item"><span class="lg-dot dot-red"></span> Sarkanais — ļoti bīstams</div>
-        </div>
-
-        <div class="toolbar">
-          <input id="q" placeholder="Meklēt (notikums, teritorija, teksts…)" />
-          <select id="level">
-            <option value="">Visi līmeņi</option>
-            <option value="YELLOW">Dzeltenais</option>
-            <option value="ORANGE">Oranžais</option>
-            <option value="RED">Sarkanais</option>
-          </select>
-          <select id="hazard"><option value="">Visas parādības</option></select>
-          <select id="region"><option value="">Visas teritorijas</option></select>
-          <div style="display:flex; gap:10px;">
-            <select id="pageSize" style="flex:1;">
-              <option value="25">25 / lapa</option>
-              <option value="50" selected>50 / lapa</option>
-              <option value="100">100 / lapa</option>
-              <option value="0">Visi</option>
-            </select>
-            <button class="btn btn-primary" id="exportBtn" title="Lejupielādēt filtrēto sarakstu CSV">Eksportēt</button>
-          </div>
-        </div>
-      </div>
-
-      <div class="table-wrap">
-        <table>
-          <thead>
-            <tr>
-              <th>Atklāts (UTC)</th>
-              <th>Krāsa</th>
-              <th>Notikums</th>
-              <th>Parādība</th>
-              <th>Teritorija</th>
-              <th>Spēkā</th>
-              <th>Teksts</th>
-              <th>Avots</th>
-            </tr>
-          </thead>
-          <tbody id="tbody"></tbody>
-        </table>
-      </div>
-
-      <div class="footer">
-        <div id="count">Rādīti ieraksti: 0 / 0</div>
-        <div class="pager">
-          <button class="btn" id="prev">◀</button>
-          <span id="pageInfo">Lapa 1</span>
-          <button class="btn" id="next">▶</button>
-        </div>
-      </div>
-    </div>
-  </div>
-
-  <!-- Modal -->
-  <div class="modal-backdrop" id="modalBg" role="dialog" aria-modal="true">
-    <div class="modal">
-      <div class="topbar">
-        <h3 id="modalTitle">Brīdinājuma teksts</h3>
-        <button class="btn" id="modalClose">Aizvērt</button>
-      </div>
-      <pre id="modalBody"></pre>
-    </div>
-  </div>
-
-<script>
-  const ALL = {data_json};
-
-  const els = {{
-    q: document.getElementById('q'),
-    level: document.getElementById('level'),
-    hazard: document.getElementById('hazard'),
-    region: document.getElementById('region'),
-    pageSize: document.getElementById('pageSize'),
-    tbody: document.getElementById('tbody'),
-    count: document.getElementById('count'),
-    prev: document.getElementById('prev'),
-    next: document.getElementById('next'),
-    pageInfo: document.getElementById('pageInfo'),
-    summary: document.getElementById('summary'),
-    exportBtn: document.getElementById('exportBtn')
-  }};
-
-  // modal refs
-  const modalBg = document.getElementById('modalBg');
-  const modalClose = document.getElementById('modalClose');
-  const modalTitle = document.getElementById('modalTitle');
-  const modalBody = document.getElementById('modalBody');
-
-  function openModal(title, text) {{
-    modalTitle.textContent = title || 'Brīdinājuma teksts';
-    modalBody.textContent = text || '';
-    modalBg.style.display = 'flex';
-  }}
-  function closeModal() {{
-    modalBg.style.display = 'none';
-  }}
-  modalClose.addEventListener('click', closeModal);
-  modalBg.addEventListener('click', (e) => {{ if (e.target === modalBg) closeModal(); }});
-  document.addEventListener('keydown', (e) => {{ if (e.key === 'Escape') closeModal(); }});
-
-  function esc(s) {{
-    return String(s || '')
-      .replaceAll('&','&amp;')
-      .replaceAll('<','&lt;')
-      .replaceAll('>','&gt;')
-      .replaceAll('"','&quot;');
-  }}
-
-  function uniq(arr) {{
-    const s = new Set();
-    arr.forEach(v => {{ if (v && String(v).trim()) s.add(String(v)); }});
-    return Array.from(s).sort((a,b)=>a.localeCompare(b));
-  }}
-
-  function initFilters() {{
-    uniq(ALL.map(r => r.hazard || '')).forEach(v => {{
-      const o = document.createElement('option');
-      o.value = v;
-      o.textContent = v;
-      els.hazard.appendChild(o);
-    }});
-
-    uniq(ALL.map(r => r.areas || '')).forEach(v => {{
-      const o = document.createElement('option');
-      o.value = v;
-      o.textContent = v;
-      els.region.appendChild(o);
-    }});
-  }}
-
-  function badge(level) {{
-    const L = String(level || '').toUpperCase();
-    let label = L;
-    if (L === 'YELLOW') label = 'Dzeltenais';
-    else if (L === 'ORANGE') label = 'Oranžais';
-    else if (L === 'RED') label = 'Sarkanais';
-    return '<span class="badge ' + L + '">' + label + '</span>';
-  }}
-
-  function fmtTime(s) {{
-    if (!s) return '';
-    const t = String(s);
-
-    // YYYY-MM-DD HH:MM
-    const base = t.replace('T',' ').slice(0,16);
-
-    if (t.endsWith('Z')) return base + ' UTC';
-    const m = t.match(/([+-]\\d\\d:\\d\\d)$/);
-    if (m) return base + ' (UTC' + m[1] + ')';
-    return base;
-  }}
-
-  function fmtPeriod(onset, expires) {{
-    const a = fmtTime(onset);
-    const b = fmtTime(expires);
-    if (!a && !b) return '';
-    if (a && b) return a + ' → ' + b;
-    return (a || b);
-  }}
-
-  function textMatch(r, q) {{
-    if (!q) return true;
-    const hay = ((r.event||'')+' '+(r.hazard||'')+' '+(r.areas||'')+' '+(r.description||'')).toLowerCase();
-    return hay.includes(q.toLowerCase());
-  }}
-
-  function filtered() {{
-    const q = els.q.value.trim();
-    const L = els.level.value.trim();
-    const H = els.hazard.value.trim();
-    const R = els.region.value.trim();
-
-    return ALL.filter(r => {{
-      if (L && String(r.level||'').toUpperCase() !== L) return false;
-      if (H && String(r.hazard||'') !== H) return false;
-      if (R && String(r.areas||'') !== R) return false;
-      if (!textMatch(r, q)) return false;
-      return true;
-    }});
-  }}
-
-  function downloadCSV(rows) {{
-    const cols = ['timestamp_utc','level','event','hazard','areas','onset','expires','description','source'];
-    const escCSV = (v) => {{
-      const s = String(v ?? '');
-      if (/[",\\n]/.test(s)) return '"' + s.replaceAll('"','""') + '"';
-      return s;
-    }};
-    const lines = [cols.join(',')].concat(rows.map(r => cols.map(c => escCSV(r[c])).join(',')));
-    const blob = new Blob([lines.join('\\n')], {{ type: 'text/csv;charset=utf-8' }});
-    const url = URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = 'filtered_history.csv';
-    document.body.appendChild(a);
-    a.click();
-    a.remove();
-    URL.revokeObjectURL(url);
-  }}
-
-  let page = 1;
-
-  function render() {{
-    const rows = filtered().sort((a,b)=>(String(b.timestamp_utc||'')).localeCompare(String(a.timestamp_utc||'')));
-    const total = rows.length;
-
-    els.summary.textContent = 'Kopā ieraksti: ' + ALL.length + ' • Filtrēti: ' + total;
-
-    const ps = parseInt(els.pageSize.value, 10);
-    let pages = 1, start = 0, end = total;
-
-    if (ps > 0) {{
-      pages = Math.max(1, Math.ceil(total / ps));
-      page = Math.min(page, pages);
-      start = (page - 1) * ps;
-      end = Math.min(total, start + ps);
-    }} else {{
-      page = 1; pages = 1;
-    }}
-
-    const shown = rows.slice(start, end);
-
-    els.tbody.innerHTML = shown.map(r => {{
-      const discovered = fmtTime(r.timestamp_utc || '');
-      const per = fmtPeriod(r.onset, r.expires);
-      const title = (String(r.level||'') + ' — ' + String(r.event||'')).trim();
-      const src = r.source ? '<a href="' + esc(r.source) + '" target="_blank" rel="noreferrer">Avots</a>' : '';
-
-      return (
-        '<tr>'
-          + '<td class="col-time">' + esc(discovered) + '</td>'
-          + '<td>' + badge(r.level||'') + '</td>'
-          + '<td>' + esc(r.event||'') + '</td>'
-          + '<td>' + esc(r.hazard||'') + '</td>'
-          + '<td>' + esc(r.areas||'') + '</td>'
-          + '<td class="col-time">' + esc(per) + '</td>'
-          + '<td><button class="btn" type="button" data-title="' + esc(title) + '" data-text="' + esc(r.description||'') + '">Rādīt</button></td>'
-          + '<td>' + src + '</td>'
-        + '</tr>'
-      );
-    }}).join('');
-
-    els.tbody.querySelectorAll('button[data-text]').forEach(btn => {{
-      btn.addEventListener('click', () => {{
-        openModal(btn.getAttribute('data-title'), btn.getAttribute('data-text'));
-      }});
-    }});
-
-    els.count.textContent = 'Rādīti ieraksti: ' + shown.length + ' / ' + total;
-    els.pageInfo.textContent = 'Lapa ' + page + ' / ' + pages;
-    els.prev.disabled = (page <= 1);
-    els.next.disabled = (page >= pages);
-
-    els.exportBtn.onclick = () => downloadCSV(rows);
-  }}
-
-  function reset() {{ page = 1; render(); }}
-
-  els.q.addEventListener('input', reset);
-  els.level.addEventListener('change', reset);
-  els.hazard.addEventListener('change', reset);
-  els.region.addEventListener('change', reset);
-  els.pageSize.addEventListener('change', reset);
-
-  els.prev.addEventListener('click', () => {{ page = Math.max(1, page-1); render(); }});
-  els.next.addEventListener('click', () => {{ page = page+1; render(); }});
-
-  initFilters();
-  render();
-</script>
-</body>
-</html>
-"""
-
-    with open(OUT_HTML, "w", encoding="utf-8") as f:
-        f.write(html)
-
-    print(f"Wrote {OUT_HTML} (rows: {len(rows)})")
+    if up_to_date():
+        sync_css()
+        print(f"Up to date: {OUT_HTML} + {OUT_DATA}")
+        return
+
+    cols, ci, rows = read_table()
+    # ISO-8601 timestamps sort correctly as strings, newest first.
+    rows.sort(key=operator.itemgetter(ci["timestamp_utc"]), reverse=True)
+
+    hazards = sorted({r[ci["hazard"]] for r in rows if r[ci["hazard"]].strip()})
+    areas = sorted({r[ci["areas"]] for r in rows if r[ci["areas"]].strip()})
+
+    # Normalize level and derive the search column so the client compares
+    # plain strings without per-row coercion. itemgetter pulls all fields in
+    # one C-level call and %-formatting beats join() for a fixed template.
+    i_level = ci["level"]
+    get_hay = operator.itemgetter(ci["event"], ci["hazard"], ci["areas"], ci["description"])
+    get_times = operator.itemgetter(ci["timestamp_utc"], ci["onset"], ci["expires"])
+    for r in rows:
+        r[i_level] = r[i_level].strip().upper()
+        ts, onset, expires = get_times(r)
+        r.append(("%s %s %s %s" % get_hay(r)).lower())
+        r.append(epoch_utc(ts))
+        r.append(fmt_time(ts))
+        r.append(fmt_period(onset, expires))
+    cols = cols + ["_hay", "_ts", "_discovered", "_period"]
+
+    # Binary writes: one bytes.encode in C plus a large buffer beats the
+    # text-mode incremental codec path for multi-MB outputs.
+    payload = dump_json({"cols": cols, "hazards": hazards, "areas": areas, "data": rows})
+
+    # Skip the rebuild when the payload is byte-identical — keeps docs/ (and
+    # the generation stamp inside index.html) untouched for no-change runs.
+    unchanged = False
+    if os.path.exists(OUT_DATA) and os.path.exists(OUT_HTML):
+        # A template edit must invalidate the cached page even with stale data.
+        if os.path.getmtime(OUT_HTML) >= os.path.getmtime(TEMPLATE):
+            with open(OUT_DATA, "rb") as f:
+                unchanged = f.read() == payload
+            if unchanged:
+                os.utime(OUT_DATA)  # re-arm the mtime fast path in up_to_date()
+
+    if not unchanged:
+        with open(OUT_DATA, "wb", buffering=1 << 20) as f:
+            f.write(payload)
+        write_compressed(OUT_DATA)
+
+        with open(OUT_HTML, "wb", buffering=1 << 20) as f:
+            tmpl.stream(gen=gen).dump(f, encoding="utf-8")
+        write_compressed(OUT_HTML)
+
+    sync_css()
+
+    print(f"Wrote {OUT_HTML} + {OUT_DATA} (rows: {len(rows)})")
 
 
 if __name__ == "__main__":
@@ -1,36 +1,104 @@
 import os
 import json
 import csv
+import hashlib
+import operator
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timezone
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import smtplib
 from email.message import EmailMessage
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 
 FEED_URL = "https://feeds.meteoalarm.org/api/v1/warnings/feeds-latvia/"
 
 STATE_FILE = "state.json"
 HISTORY_CSV = "history.csv"
 
+# One pooled session for the run: reuses the TLS connection across the feed
+# fetch and every Telegram send instead of handshaking per request.
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "lvgmc-warning-bot"
+# Retry transient 5xx on GETs (the feed fetch) with backoff, reusing the
+# pooled connection across attempts. POSTs (Telegram) are not retried.
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=5, backoff_factor=1,
+                      status_forcelist=[500, 502, 503, 504])
+))
+
 
 # ---------------- helpers ----------------
 
 def utc_now():
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
+# Content fields only — timestamp_utc is stamped per run and would make every
+# warning look changed on every poll.
+FINGERPRINT_FIELDS = (
+    "identifier", "level", "hazard", "event", "areas",
+    "onset", "expires", "description", "source"
+)
+
+def fingerprint(w):
+    # Equality check only — xxh3 is far faster than a crypto hash, and
+    # blake2b beats SHA-256 when we fall back to the stdlib. Short digests
+    # keep state.json small; stale-format entries just re-emit once.
+    # Fields stream straight into the hasher, no intermediate buffer.
+    h = xxhash.xxh3_64() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    for k in FINGERPRINT_FIELDS:
+        h.update(str(w.get(k, "")).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+def _expired(exp, now_ts):
+    if not exp:
+        return False
+    try:
+        return datetime.fromisoformat(exp.replace("Z", "+00:00")).timestamp() < now_ts
+    except ValueError:
+        return False
+
 def load_state():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
+    # No exists() pre-check — opening directly saves a stat and the missing
+    # file is just the first-run case, not an error.
+    try:
+        with open(STATE_FILE, "rb") as f:
+            raw = f.read()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        pass  # corrupt state: start fresh, warnings re-emit once
     return {"seen": {}, "last_run": ""}
 
 def save_state(state):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    # Write-then-rename: a crash mid-write leaves the old state intact
+    # instead of a truncated file that load_state() discards (which would
+    # re-alert every warning on the next run). No fsync — the workflow
+    # commits the file to git right after anyway.
+    tmp = STATE_FILE + ".tmp"
+    if orjson is not None:
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, STATE_FILE)
 
 def ensure_csv():
     if os.path.exists(HISTORY_CSV):
@@ -50,28 +118,29 @@ def ensure_csv():
             "source"
         ])
 
+# Column order of history.csv; itemgetter pulls a whole row tuple in one call.
+_row_fields = operator.itemgetter(
+    "timestamp_utc", "identifier", "level", "hazard", "event",
+    "areas", "onset", "expires", "description", "source"
+)
+
 def append_csv(rows):
-    ensure_csv()
-    with open(HISTORY_CSV, "a", encoding="utf-8", newline="") as f:
-        w = csv.writer(f)
-        for r in rows:
-            w.writerow([
-                r["timestamp_utc"],
-                r["identifier"],
-                r["level"],
-                r["hazard"],
-                r["event"],
-                r["areas"],
-                r["onset"],
-                r["expires"],
-                r["description"],
-                r["source"]
-            ])
+    with open(HISTORY_CSV, "a", encoding="utf-8", newline="", buffering=1 << 16) as f:
+        csv.writer(f).writerows(map(_row_fields, rows))
+        # One fsync for the whole batch: a crash can no longer leave a
+        # truncated last row for the next build to trip over.
+        f.flush()
+        os.fsync(f.fileno())
 
 
 # ---------------- notifications ----------------
 
-def send_email(subject, body):
+def send_email(messages):
+    """Send every (subject, body) pair over a single SMTP connection — the
+    STARTTLS + AUTH handshake is paid once per run, not once per message."""
+    if not messages:
+        return
+
     host = os.getenv("SMTP_HOST")
     port = int(os.getenv("SMTP_PORT", "587"))
     user = os.getenv("SMTP_USER")
@@ -83,16 +152,39 @@ def send_email(subject, body):
         print("Email not configured, skipping.")
         return
 
-    msg = EmailMessage()
-    msg["From"] = frm
-    msg["To"] = to
-    msg["Subject"] = subject
-    msg.set_content(body)
-
     with smtplib.SMTP(host, port) as s:
         s.starttls()
         s.login(user, pwd)
-        s.send_message(msg)
+        for subject, body in messages:
+            msg = EmailMessage()
+            msg["From"] = frm
+            msg["To"] = to
+            msg["Subject"] = subject
+            msg.set_content(body)
+            s.send_message(msg)
+
+TG_MAX_LEN = 3900  # headroom under Telegram's 4096-char message limit
+
+LEVEL_ORDER = ("RED", "ORANGE", "YELLOW", "GREEN")
+
+# Parsed once at import — the env var cannot change mid-run.
+TG_LEVELS = frozenset(
+    x.strip() for x in os.getenv("TG_LEVELS", "ORANGE,RED").split(",") if x.strip()
+)
+
+def chunk_messages(alerts, sep="\n\n———\n\n"):
+    """Pack alert texts into as few messages as the length limit allows."""
+    chunks = []
+    cur = ""
+    for a in alerts:
+        if cur and len(cur) + len(sep) + len(a) > TG_MAX_LEN:
+            chunks.append(cur)
+            cur = a
+        else:
+            cur = cur + sep + a if cur else a
+    if cur:
+        chunks.append(cur)
+    return chunks
 
 def telegram_send(text):
     token = os.getenv("TG_BOT_TOKEN")
@@ -101,42 +193,67 @@ def telegram_send(text):
         return
 
     url = f"https://api.telegram.org/bot{token}/sendMessage"
-    requests.post(url, json={
+    SESSION.post(url, json={
         "chat_id": chat_id,
         "text": text,
         "disable_web_page_preview": True
     }, timeout=20)
 
+def telegram_send_all(alerts):
+    # One task sends every chunk so a split digest keeps its reading order.
+    for chunk in chunk_messages(alerts):
+        telegram_send(chunk)
+
 
 # ---------------- feed ----------------
 
-def fetch_feed():
-    r = requests.get(FEED_URL, timeout=30)
+def fetch_feed(state):
+    """Conditional GET: replay the validators from the last 200 response and
+    return None on 304, so unchanged feeds cost zero body bytes and no parse.
+    On 200 the fresh ETag/Last-Modified are stashed back into state."""
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    r = SESSION.get(FEED_URL, timeout=30, headers=headers)
+    if r.status_code == 304:
+        return None
     r.raise_for_status()
+
+    state["etag"] = r.headers.get("ETag", "")
+    state["last_modified"] = r.headers.get("Last-Modified", "")
+    if orjson is not None:
+        return orjson.loads(r.content)
     return r.json()
 
+MARINE_KEYWORDS = ("jūra", "līcis", "marine", "sea", "coast")
+_MARINE_RE = re.compile("|".join(re.escape(k) for k in MARINE_KEYWORDS), re.IGNORECASE)
+
+# Many warnings share the same hazard/area text; cache the regex verdict.
+@lru_cache(maxsize=256)
 def is_marine(text):
-    t = text.lower()
-    for w in ["jūra", "līcis", "marine", "sea", "coast"]:
-        if w in t:
-            return True
-    return False
+    return bool(_MARINE_RE.search(text))
 
-def normalize(feed):
+def normalize(feed, now_iso):
     out = []
     items = feed.get("warnings") or feed.get("data") or []
+    # Hoisted out of the loop: the env lookup is per-run, not per-item.
+    suppress_marine = os.getenv("SUPPRESS_MARINE", "1") == "1"
     for i in items:
         level = (i.get("level") or i.get("color") or "").upper()
         identifier = i.get("identifier") or f"{level}-{i.get('event','')}-{i.get('area','')}"
         hazard = i.get("event", "")
         areas = i.get("area", "")
-        desc = i.get("description", "")
-        if os.getenv("SUPPRESS_MARINE", "1") == "1":
-            if is_marine(hazard + " " + areas):
-                continue
+        # Cap up front so fingerprinting, CSV and the page payload all do
+        # bounded work however large the feed's description gets.
+        desc = (i.get("description") or "")[:2000]
+        if suppress_marine and is_marine(hazard + " " + areas):
+            continue
 
         out.append({
-            "timestamp_utc": utc_now(),
+            "timestamp_utc": now_iso,
             "identifier": identifier,
             "level": level,
             "hazard": hazard,
@@ -153,39 +270,105 @@ def normalize(feed):
 # ---------------- main ----------------
 
 def main():
+    now_iso = utc_now()  # one timestamp per run, shared by rows and state
+
     state = load_state()
     seen = state.get("seen", {})
+    ensure_csv()  # one-shot header check per run, not per append
 
-    feed = fetch_feed()
-    warnings = normalize(feed)
+    validators = (state.get("etag"), state.get("last_modified"))
+    feed = fetch_feed(state)
+    if feed is None:
+        print("OK: feed not modified")
+        return
+    warnings = normalize(feed, now_iso)
 
     changed = []
     history_add = []
+    migrated = []
+    current = set()
 
     for w in warnings:
-        fp = json.dumps(w, ensure_ascii=False, sort_keys=True)
-        if seen.get(w["identifier"]) != fp:
-            seen[w["identifier"]] = fp
+        ident = w["identifier"]
+        current.add(ident)
+        fp = fingerprint(w)
+        ent = seen.get(ident)
+        # Older state files stored the bare fingerprint string.
+        old_fp = ent.get("fp") if isinstance(ent, dict) else ent
+        if old_fp != fp:
+            seen[ident] = {"fp": fp, "exp": w["expires"]}
             changed.append(w)
             history_add.append(w)
+        elif not isinstance(ent, dict):
+            # Unchanged legacy entry: upgrade it in place without re-alerting.
+            seen[ident] = {"fp": fp, "exp": w["expires"]}
+            migrated.append(ident)
 
     if history_add:
         append_csv(history_add)
 
     if changed:
-        lines = []
-        for w in changed:
-            lines.append(f"[{w['level']}] {w['event']} — {w['areas']}")
-        send_email("LVGMC brīdinājumu izmaiņas", "\n".join(lines))
-
-        levels = set(x.strip() for x in os.getenv("TG_LEVELS","ORANGE,RED").split(","))
+        # Severity-first digest via one bucketing pass — RED tops the email
+        # without a sort, and feed order is kept within each level.
+        buckets = {lvl: [] for lvl in LEVEL_ORDER}
+        other = []
         for w in changed:
-            if w["level"] in levels:
-                telegram_send(f"⚠️ {w['level']} — {w['event']}\n{w['areas']}")
-
-    state["seen"] = seen
-    state["last_run"] = utc_now()
-    save_state(state)
+            buckets.get(w["level"], other).append(w)
+        ordered = [w for lvl in LEVEL_ORDER for w in buckets[lvl]] + other
+
+        lines = [f"[{w['level']}] {w['event']} — {w['areas']}" for w in ordered]
+        alerts = [
+            f"⚠️ {w['level']} — {w['event']}\n{w['areas']}"
+            for w in ordered if w["level"] in TG_LEVELS
+        ]
+
+        # SMTP and the Telegram API are independent, so their round trips
+        # overlap; .result() re-raises failures before state is saved, which
+        # keeps "crash before save → re-alert next run" behaviour intact.
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            futures = [
+                ex.submit(send_email, [("LVGMC brīdinājumu izmaiņas", "\n".join(lines))]),
+                ex.submit(telegram_send_all, alerts),
+            ]
+            for fut in futures:
+                fut.result()
+
+    # Forget warnings that expired over 48h ago — without this, seen grows by
+    # every identifier ever issued and save_state re-serializes all of them
+    # forever. Identifiers still in the feed are never pruned (Meteoalarm
+    # routinely carries items past their expires; dropping those would make
+    # them re-alert as "new" every run), and the grace window covers brief
+    # disappearances. Entries without an expires timestamp get stamped with
+    # the run they vanished on and age out through the same window; legacy
+    # bare-string entries no longer in the feed are dropped outright.
+    cutoff_ts = time.time() - 48 * 3600
+    expired = []
+    stamped = []
+    for k, v in seen.items():
+        if k in current:
+            if isinstance(v, dict) and v.pop("gone", None) is not None:
+                stamped.append(k)  # reappeared: clear the vanish marker
+            continue
+        if not isinstance(v, dict):
+            expired.append(k)
+        elif v.get("exp"):
+            if _expired(v["exp"], cutoff_ts):
+                expired.append(k)
+        elif not v.get("gone"):
+            v["gone"] = now_iso
+            stamped.append(k)
+        elif _expired(v["gone"], cutoff_ts):
+            expired.append(k)
+    for k in expired:
+        del seen[k]
+
+    # Persist only when something actually changed (warnings, pruning,
+    # entry migration, vanish stamps, or the cache validators): an untouched
+    # state.json keeps the workflow's commit step a no-op on quiet runs.
+    if changed or expired or migrated or stamped or (state.get("etag"), state.get("last_modified")) != validators:
+        state["seen"] = seen
+        state["last_run"] = now_iso
+        save_state(state)
 
     print(f"OK: {len(changed)} changes")
 